@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for serving the Music Scanner API in production
+Run with: gunicorn -c gunicorn.conf.py main:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Scans spend most of their time waiting on Vision, Groq and YouTube,
+# so threaded workers let each process serve several scans at once
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# A cold scan (OCR + identification + search) can take well over the default 30s
+timeout = 120
@@ -5,8 +5,14 @@ AI-powered sheet music scanner optimized for accuracy over complexity
 """
 
 import base64
-import json
+import diskcache
+import hashlib
+import html
+import itertools
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import os
 import sys
@@ -14,13 +20,17 @@ from PIL import Image
 import io
 from typing import List, Dict, Optional, Tuple
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, asdict
-import isodate
 import urllib.parse
 
 # Flask imports
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
+from rapidfuzz import process, fuzz, utils
 
 # Configuration - UPDATE THESE WITH YOUR API KEYS
 GOOGLE_VISION_API_KEY = ""
@@ -30,7 +40,7 @@ YOUTUBE_API_KEYS = [
 ]
 
 # Supported instruments list
-SUPPORTED_INSTRUMENTS = [
+SUPPORTED_INSTRUMENTS = (
     "alto saxophone", "baritone saxophone", "tenor saxophone", "soprano saxophone",
     "bass clarinet", "clarinet", "bassoon", "contrabassoon", 
     "cello", "double bass", "viola", "violin",
@@ -38,7 +48,167 @@ SUPPORTED_INSTRUMENTS = [
     "flute", "piccolo", "oboe", "english horn",
     "piano", "harp", "percussion", "timpani",
     "guitar", "electric guitar", "bass guitar"
-]
+)
+
+# Images within these limits are sent to Vision untouched; larger ones are downscaled and re-encoded
+VISION_MAX_DIMENSION = 1024
+VISION_PASSTHROUGH_MAX_BYTES = 1024 * 1024
+
+# Keep-alive pool sizing - parallel YouTube searches from concurrent scans share connections per host
+HTTP_POOL_HOSTS = 10
+HTTP_POOL_CONNECTIONS_PER_HOST = 20
+
+# Worker threads shared by all scans for concurrent upstream requests
+IO_WORKER_THREADS = 16
+
+# (connect, read) timeouts in seconds - a slow upstream fails fast instead of holding a worker thread.
+# The connect timeout sits just above a multiple of 3s, the TCP SYN retransmit interval.
+HTTP_CONNECT_TIMEOUT = 3.05
+VISION_TIMEOUT = (HTTP_CONNECT_TIMEOUT, 20)
+GROQ_TIMEOUT = (HTTP_CONNECT_TIMEOUT, 12)
+YOUTUBE_TIMEOUT = (HTTP_CONNECT_TIMEOUT, 10)
+WARMUP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, 5)
+
+# Hosts contacted after OCR - connections are opened while Vision runs
+WARMUP_URLS = (
+    "https://api.groq.com/",
+    "https://www.googleapis.com/",
+)
+WARMUP_INTERVAL_SECONDS = 60
+
+# Vision API limit for the number of images in a single images:annotate call
+VISION_MAX_IMAGES_PER_REQUEST = 16
+
+# Groq models for piece identification - fast model first, larger model for low-confidence retries
+IDENTIFY_MODEL = "llama-3.1-8b-instant"
+IDENTIFY_FALLBACK_MODEL = "llama-3.3-70b-versatile"
+
+# Constant-time membership checks for supported instruments
+SUPPORTED_INSTRUMENTS_SET = frozenset(SUPPORTED_INSTRUMENTS)
+
+# Short list of instruments suggested in /scan validation errors
+SUPPORTED_INSTRUMENTS_PREVIEW = SUPPORTED_INSTRUMENTS[:10]
+
+# YouTube video IDs are 11 characters long and contain letters, numbers, hyphens, and underscores
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+# Standard base64 alphabet with optional trailing padding
+BASE64_RE = re.compile(r'[A-Za-z0-9+/]+={0,2}')
+
+# YouTube contentDetails.duration, e.g. PT4M13S, PT1H2M, P1DT3H (days only on very long streams), P0D
+YOUTUBE_DURATION_RE = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+# Number of videos returned per scan
+MAX_RESULT_VIDEOS = 5
+
+# VideoResult fields that are renamed in API responses
+VIDEO_API_FIELD_NAMES = {"video_id": "id", "video_url": "url"}
+
+# Collapses runs of whitespace when normalizing OCR text for cache keys
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Weights of the title, composer, scene and duration scores in overall_accuracy_score
+ACCURACY_WEIGHTS = np.array([0.35, 0.35, 0.15, 0.15])
+
+# Common names and ambiguous stems mapped onto the supported instrument they usually mean
+INSTRUMENT_ALIASES = {
+    "bass": "double bass",
+    "string bass": "double bass",
+    "upright bass": "double bass",
+    "contrabass": "double bass",
+    "electric bass": "bass guitar",
+    "electric bass guitar": "bass guitar",
+    "sax": "alto saxophone",
+    "saxophone": "alto saxophone",
+    "alto sax": "alto saxophone",
+    "tenor sax": "tenor saxophone",
+    "soprano sax": "soprano saxophone",
+    "bari sax": "baritone saxophone",
+    "baritone sax": "baritone saxophone",
+    "horn": "french horn",
+    "cor anglais": "english horn",
+    "drums": "percussion",
+}
+
+# Word sets of the supported instruments for whole-word matching ("trumpet in bb", "alto")
+INSTRUMENT_TOKENS = tuple((instrument, frozenset(instrument.split())) for instrument in SUPPORTED_INSTRUMENTS)
+
+# Abbreviated words expanded inside longer names ("eb alto sax" -> "eb alto saxophone")
+INSTRUMENT_WORD_ALIASES = {"sax": "saxophone", "bari": "baritone"}
+
+# Every word of a supported name or alias - a trailing "s" is only dropped when it leaves one of these
+INSTRUMENT_WORDS = frozenset(
+    word
+    for name in SUPPORTED_INSTRUMENTS + tuple(INSTRUMENT_ALIASES)
+    for word in name.split()
+)
+
+# Part labels printed on real parts: numbers ("1", "2nd", "ii") and keys ("in f", "in bb", "in e flat")
+INSTRUMENT_PART_NUMBER_RE = re.compile(r'\d+(?:st|nd|rd|th)?|i{1,3}|iv')
+INSTRUMENT_KEY_RE = re.compile(r'[a-g](?:b|s|is|es)?')
+
+# Minimum WRatio score (0-100) for mapping a misspelled instrument onto a supported one
+INSTRUMENT_MATCH_THRESHOLD = 85
+
+# YouTube Data API limit for the number of IDs in a single videos.list call
+YOUTUBE_MAX_IDS_PER_REQUEST = 50
+
+# Skip the remaining search strategies when the first one returns a full page of results
+# and enough of their snippet titles match both the piece title and composer (0-10 scale)
+EARLY_EXIT_MIN_VIDEOS = 10
+EARLY_EXIT_MIN_MATCHES = 5
+EARLY_EXIT_MATCH_SCORE = 7.0
+
+# Persistent response cache - repeat scans of the same sheet skip Vision and YouTube, even across restarts
+CACHE_DIR = os.environ.get("SHEETSCAN_CACHE_DIR", "/tmp/sheetscan_cache")
+CACHE_SIZE_LIMIT_BYTES = int(os.environ.get("SHEETSCAN_CACHE_SIZE_LIMIT", 2 ** 30))
+OCR_CACHE_TTL_SECONDS = int(os.environ.get("SHEETSCAN_OCR_CACHE_TTL", 7 * 24 * 60 * 60))
+YOUTUBE_CACHE_TTL_SECONDS = int(os.environ.get("SHEETSCAN_YOUTUBE_CACHE_TTL", 24 * 60 * 60))
+IDENTIFY_CACHE_TTL_SECONDS = int(os.environ.get("SHEETSCAN_IDENTIFY_CACHE_TTL", 7 * 24 * 60 * 60))
+SCAN_CACHE_TTL_SECONDS = int(os.environ.get("SHEETSCAN_SCAN_CACHE_TTL", 7 * 24 * 60 * 60))
+
+# Cache key prefixes, each with its own hit/miss counters on /health
+CACHE_NAMESPACES = ("ocr", "identify", "yt", "scan")
+
+# Bump when the identification prompt or ranking logic changes so cached identifications and scans are not reused
+PROMPT_VERSION = "v2"
+
+# Piece identification prompt - the OCR text is appended last so the static prefix is identical on every call
+IDENTIFY_PROMPT_PREFIX = """Analyze this sheet music text to identify the essential information. Even if unclear, make educated guesses based on what you can see:
+
+I need you to identify:
+1. **Title** - The name of the piece (be precise, include subtitles if present)
+2. **Composer** - The composer's name (last name only is perfectly fine)
+3. **Scene/Movement** - Any specific movement, scene, act, or section (if present)
+
+IMPORTANT RULES:
+- **Make educated guesses even if text is unclear or ambiguous**
+- **You MUST be able to identify a composer - if you truly cannot, return "Unknown" and explain why**
+- **Only set confidence to "low" if the text makes absolutely no musical sense or appears to be completely unrelated to sheet music**
+- Even partial information is valuable - if you can identify either a title OR composer (even with uncertainty), proceed with medium confidence
+- Composer last names are totally acceptable (e.g., "Messager", "Brahms", "Mozart")
+- Many pieces don't have scene/movement information - this is completely normal
+- If you see musical terms, instrument names, or anything that suggests this is sheet music, try to extract whatever title/composer info you can find
+- Don't include generic terms like "for orchestra" or instrument names in the title unless they're clearly part of the actual piece title
+
+CONFIDENCE LEVELS:
+- **HIGH**: Clear title and composer, may or may not have scene/movement
+- **MEDIUM**: Can identify at least a title OR composer with reasonable confidence, even if some ambiguity exists
+- **LOW**: Only use this if the text appears to be completely unrelated to music (e.g., random text, technical manuals, etc.) or makes absolutely no sense
+
+STRATEGY: Be optimistic and make reasonable guesses. Musicians often work with incomplete or unclear sheet music, so help them by extracting whatever useful information you can find, even if imperfect.
+
+Return your response in this JSON format:
+{
+    "title": "exact piece title or best guess based on available text",
+    "composer": "composer name (last name is fine) or 'Unknown' if truly cannot identify",
+    "scene_movement": "specific scene/movement if clearly visible, empty string if not",
+    "confidence": "high/medium/low",
+    "reasoning": "brief explanation of what you found and why you chose this confidence level"
+}
+
+EXTRACTED TEXT:
+"""
 
 # EXACT SAME DATA STRUCTURES AS WORKING STANDALONE VERSION
 @dataclass
@@ -49,7 +219,7 @@ class PieceIdentification:
     confidence: str
     reasoning: str
 
-@dataclass
+@dataclass(slots=True)
 class VideoResult:
     video_id: str
     title: str
@@ -65,11 +235,44 @@ class VideoResult:
     scene_match_score: float
     duration_match_score: float
     overall_accuracy_score: float
+    
+    def to_api_dict(self) -> dict:
+        """Serialize for the /scan response (video_id -> id, video_url -> url)"""
+        return {VIDEO_API_FIELD_NAMES.get(name, name): getattr(self, name) for name in self.__slots__}
 
 class AccurateMusicScannerAPI:
     """EXACT SAME CLASS AS STANDALONE VERSION - Just adapted for Flask"""
     def __init__(self):
-        self.current_youtube_key_index = 0
+        self.youtube_key_cycle = itertools.cycle(YOUTUBE_API_KEYS)
+        self.youtube_key_lock = threading.Lock()
+        # One session for all upstream calls so TCP/TLS connections are reused across scans
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=HTTP_POOL_HOSTS,
+            pool_maxsize=HTTP_POOL_CONNECTIONS_PER_HOST
+        ))
+        self.last_warmup = 0.0
+        # Shared worker threads for upstream I/O (search fan-out, connection warm-up) across all scans
+        self.executor = ThreadPoolExecutor(max_workers=IO_WORKER_THREADS, thread_name_prefix="sheetscan-io")
+        self.cache = diskcache.Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT_BYTES)
+        # Counted in-process: diskcache's own statistics turn every get into an SQLite write
+        self.cache_counts = {namespace: {"hits": 0, "misses": 0} for namespace in CACHE_NAMESPACES}
+        self.cache_counts_lock = threading.Lock()
+    
+    def get_cached(self, cache_key: str):
+        """Look up a cache entry, counting the hit or miss under the key's namespace prefix"""
+        value = self.cache.get(cache_key)
+        namespace = cache_key.split(":", 1)[0]
+        with self.cache_counts_lock:
+            self.cache_counts[namespace]["hits" if value is not None else "misses"] += 1
+        return value
+    
+    def get_cache_stats(self) -> dict:
+        """Hit/miss counters per cache namespace since this worker started, plus the shared entry count"""
+        with self.cache_counts_lock:
+            stats = {namespace: dict(counts) for namespace, counts in self.cache_counts.items()}
+        stats["entries"] = len(self.cache)
+        return stats
     
     def create_error_response(self, error_message: str) -> dict:
         """Create standardized error response"""
@@ -92,32 +295,94 @@ class AccurateMusicScannerAPI:
         instrument_lower = instrument.lower().strip()
         
         # Check if instrument is in supported list
-        if instrument_lower in SUPPORTED_INSTRUMENTS:
+        if instrument_lower in SUPPORTED_INSTRUMENTS_SET:
             return instrument_lower
         
-        # Try to find partial matches for common variations
-        for supported in SUPPORTED_INSTRUMENTS:
-            if instrument_lower in supported or supported in instrument_lower:
-                return supported
+        words = self.instrument_name_words(instrument_lower)
+        normalized = " ".join(words)
+        if normalized in SUPPORTED_INSTRUMENTS_SET:
+            return normalized
+        if normalized in INSTRUMENT_ALIASES:
+            return INSTRUMENT_ALIASES[normalized]
         
-        # If no match found, use as-is but log it
-        print(f"⚠️ Instrument '{instrument}' not in supported list, using anyway")
+        # Whole-word matches: the input names a supported instrument plus extras ("bb clarinet"),
+        # preferring the most specific one, or is part of exactly one instrument name ("alto")
+        words = [INSTRUMENT_WORD_ALIASES.get(word, word) for word in words]
+        tokens = frozenset(words)
+        if tokens:
+            contained = [(len(words), instrument) for instrument, words in INSTRUMENT_TOKENS if words <= tokens]
+            if contained:
+                contained.sort(reverse=True)
+                if len(contained) == 1 or contained[0][0] > contained[1][0]:
+                    return contained[0][1]
+            else:
+                containing = [instrument for instrument, words in INSTRUMENT_TOKENS if tokens <= words]
+                if len(containing) == 1:
+                    return containing[0]
+        
+        # Typos and plurals ("clarinets", "basoon") - ties between instruments are too ambiguous to pick
+        matches = process.extract(
+            normalized,
+            SUPPORTED_INSTRUMENTS,
+            scorer=fuzz.WRatio,
+            score_cutoff=INSTRUMENT_MATCH_THRESHOLD,
+            limit=2
+        )
+        if matches and (len(matches) == 1 or matches[0][1] > matches[1][1]):
+            return matches[0][0]
+        
+        # If no match found, return as-is but log it (the /scan endpoint rejects it)
+        print(f"⚠️ Instrument '{instrument}' not in supported list")
         return instrument_lower
     
-    def scan_music_from_base64(self, image_data_b64: str, target_instrument: str = "clarinet") -> dict:
-        """Complete scanning function - ADAPTED from standalone version for base64 input"""
+    def instrument_name_words(self, instrument_lower: str) -> List[str]:
+        """Split an instrument label into words without part numbers, keys or plural endings ("Horns in F 1" -> ["horn"])"""
+        words = utils.default_process(instrument_lower).split()
+        
+        # Strip trailing part labels in any order ("horn in f 1", "trumpet 2 in bb")
+        while words:
+            if INSTRUMENT_PART_NUMBER_RE.fullmatch(words[-1]):
+                words.pop()
+            elif len(words) >= 2 and words[-2] == "in" and INSTRUMENT_KEY_RE.fullmatch(words[-1]):
+                del words[-2:]
+            elif len(words) >= 3 and words[-3] == "in" and words[-1] in ("flat", "sharp") and INSTRUMENT_KEY_RE.fullmatch(words[-2]):
+                del words[-3:]
+            else:
+                break
+        
+        # Leading part numbers ("2nd horn", "ii violin")
+        while len(words) > 1 and INSTRUMENT_PART_NUMBER_RE.fullmatch(words[0]):
+            words.pop(0)
+        
+        # Simple plurals ("horns", "saxes") - "bass" and other real words are left alone
+        for i, word in enumerate(words):
+            if word in INSTRUMENT_WORDS:
+                continue
+            if word.endswith("es") and word[:-2] in INSTRUMENT_WORDS:
+                words[i] = word[:-2]
+            elif word.endswith("s") and word[:-1] in INSTRUMENT_WORDS:
+                words[i] = word[:-1]
+        
+        return words
+    
+    def scan_music_from_base64(self, image_data_b64: str, target_instrument: str = "clarinet") -> Tuple[dict, bool]:
+        """Complete scanning function - ADAPTED from standalone version for base64 input.
+        
+        Returns the response body and whether it is complete enough to cache (no search strategy failed).
+        """
         try:
             # Validate and normalize instrument
             validated_instrument = self.validate_instrument(target_instrument)
             print(f"🎺 Scanning for instrument: {validated_instrument}")
             print("🎯 Using simplified accuracy-focused approach")
             
-            # Step 1: Extract text from base64 image
+            # Step 1: Extract text from base64 image, opening Groq/YouTube connections meanwhile
             print("📸 Extracting text from image...")
+            self.warm_up_connections()
             extracted_text = self.extract_text_from_base64(image_data_b64)
             
             if not extracted_text or len(extracted_text.strip()) < 5:
-                return self.create_error_response("No readable text found in image")
+                return self.create_error_response("No readable text found in image"), False
             
             print(f"✅ Text extracted: {len(extracted_text)} characters")
             print(f"📝 Preview: {extracted_text[:150]}...")
@@ -127,7 +392,7 @@ class AccurateMusicScannerAPI:
             piece_id = self.identify_piece_simple(extracted_text)
             
             if piece_id.confidence.lower() == 'low':
-                return self.create_error_response(piece_id.reasoning)
+                return self.create_error_response(piece_id.reasoning), False
             
             print(f"✅ Identified: '{piece_id.title}' by {piece_id.composer}")
             if piece_id.scene_movement:
@@ -139,10 +404,10 @@ class AccurateMusicScannerAPI:
             
             # Step 4: Search YouTube
             print("📺 Searching YouTube...")
-            videos = self.search_youtube_simple(search_terms)
+            videos, search_complete = self.search_youtube_simple(search_terms, piece_id)
             
             if not videos:
-                return self.create_error_response("No videos found on YouTube - try checking your internet connection")
+                return self.create_error_response("No videos found on YouTube - try checking your internet connection"), False
             
             # Step 5: Rank by accuracy with scene prioritization
             print("🎯 Ranking by accuracy (prioritizing scene matches)...")
@@ -151,163 +416,190 @@ class AccurateMusicScannerAPI:
             # Get top 5 videos - prefer high accuracy but always return up to 5 if available
             high_accuracy_videos = [v for v in ranked_videos if v.overall_accuracy_score >= 6.0]
             
-            if len(high_accuracy_videos) >= 5:
+            if len(high_accuracy_videos) >= MAX_RESULT_VIDEOS:
                 # We have enough high-accuracy videos
-                selected_videos = high_accuracy_videos[:5]
+                selected_videos = high_accuracy_videos[:MAX_RESULT_VIDEOS]
             else:
                 # Take all high-accuracy videos plus fill remainder with best available
-                selected_videos = ranked_videos[:5]  # Just take top 5 regardless of score
+                selected_videos = ranked_videos[:MAX_RESULT_VIDEOS]  # Just take top 5 regardless of score
             
             result = {
-                "piece_identification": {
-                    "title": piece_id.title,
-                    "composer": piece_id.composer,
-                    "scene_movement": piece_id.scene_movement,
-                    "confidence": piece_id.confidence,
-                    "reasoning": piece_id.reasoning
-                },
-                "videos": [
-                    {
-                        "id": video.video_id,
-                        "title": video.title,
-                        "channel": video.channel,
-                        "url": video.video_url,
-                        "views": video.views,
-                        "likes": video.likes,
-                        "duration": video.duration,
-                        "duration_seconds": video.duration_seconds,
-                        "search_strategy": video.search_strategy,
-                        "title_match_score": video.title_match_score,
-                        "composer_match_score": video.composer_match_score,
-                        "scene_match_score": video.scene_match_score,
-                        "duration_match_score": video.duration_match_score,
-                        "overall_accuracy_score": video.overall_accuracy_score
-                    }
-                    for video in selected_videos
-                ]
+                "piece_identification": asdict(piece_id),
+                "videos": [video.to_api_dict() for video in selected_videos]
             }
             
             scene_matches = sum(1 for v in result['videos'] if v['scene_match_score'] >= 8.0)
             high_accuracy_count = sum(1 for v in result['videos'] if v['overall_accuracy_score'] >= 6.0)
             print(f"✅ Found {len(result['videos'])} videos ({high_accuracy_count} high accuracy, {scene_matches} with scene matches)")
-            return result
+            return result, search_complete
             
+        except requests.exceptions.Timeout as e:
+            error_msg = f"Scan failed: upstream service timed out ({str(e)})"
+            print(f"❌ {error_msg}")
+            return self.create_error_response(error_msg), False
         except Exception as e:
             error_msg = f"Scan failed: {str(e)}"
             print(f"❌ {error_msg}")
-            return self.create_error_response(error_msg)
+            return self.create_error_response(error_msg), False
+    
+    def warm_up_connections(self):
+        """Pre-open pooled connections to the services used after OCR (DNS + TCP + TLS)"""
+        now = time.time()
+        if now - self.last_warmup < WARMUP_INTERVAL_SECONDS:
+            return  # Pooled connections from recent scans are still alive
+        self.last_warmup = now
+        
+        # Fire-and-forget: the scan never waits on a warm-up request
+        for url in WARMUP_URLS:
+            self.executor.submit(self.warm_up_connection, url)
+    
+    def warm_up_connection(self, url: str):
+        """Send a cheap HEAD request so the session keeps an open connection to the host"""
+        try:
+            self.session.head(url, timeout=WARMUP_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            print(f"    ⚠️ Connection warm-up failed for {url}: {e}")
     
     def extract_text_from_base64(self, base64_image: str) -> str:
-        """Extract text from base64 image using Google Vision API"""
-        # Optimize image first
+        """Extract text from base64 image using Google Vision API, reusing cached OCR for identical images"""
+        return self.extract_text_from_base64_pages([base64_image])
+    
+    def extract_text_from_base64_pages(self, base64_images: List[str]) -> str:
+        """Extract text from one or more sheet music pages with batched Vision requests"""
+        page_texts = [""] * len(base64_images)
+        pending_pages = []  # (page index, image hash, optimized base64)
+        
+        for index, base64_image in enumerate(base64_images):
+            try:
+                image_data = base64.b64decode(base64_image)
+            except Exception:
+                image_data = base64_image.encode('utf-8')
+            
+            image_hash = hashlib.sha256(image_data).hexdigest()
+            cached_text = self.get_cached(f"ocr:{image_hash}")
+            if cached_text is not None:
+                print(f"♻️ Using cached OCR result for page {index + 1}")
+                page_texts[index] = cached_text
+            else:
+                pending_pages.append((index, image_hash, self.optimize_image_for_vision(base64_image, image_data)))
+        
+        # Vision accepts up to 16 images per images:annotate call
+        for start in range(0, len(pending_pages), VISION_MAX_IMAGES_PER_REQUEST):
+            batch = pending_pages[start:start + VISION_MAX_IMAGES_PER_REQUEST]
+            responses = self.annotate_images([optimized_b64 for _, _, optimized_b64 in batch])
+            
+            for (index, image_hash, _), page_response in zip(batch, responses):
+                if 'error' in page_response:
+                    raise Exception(f"Vision API error: {page_response['error']}")
+                
+                text_annotations = page_response.get('textAnnotations', [])
+                if text_annotations:
+                    page_texts[index] = text_annotations[0].get('description', '')
+                    self.cache.set(f"ocr:{image_hash}", page_texts[index], expire=OCR_CACHE_TTL_SECONDS)
+        
+        if not any(page_texts):
+            raise Exception("No text found in image")
+        
+        return "\n\n".join(text for text in page_texts if text)
+    
+    def optimize_image_for_vision(self, base64_image: str, image_data: bytes) -> str:
+        """Downscale and re-encode large images; small images are returned untouched"""
         try:
-            # Decode base64 to image
-            image_data = base64.b64decode(base64_image)
             image = Image.open(io.BytesIO(image_data))
             
+            if max(image.size) <= VISION_MAX_DIMENSION and len(image_data) <= VISION_PASSTHROUGH_MAX_BYTES:
+                # Already small - Vision accepts it as-is, so skip the decode/re-encode round trip
+                return base64_image
+            
+            # For JPEGs, let libjpeg downscale in the DCT domain while decoding
+            image.draft('RGB', (VISION_MAX_DIMENSION, VISION_MAX_DIMENSION))
+            
             if image.mode != 'RGB':
                 image = image.convert('RGB')
             
-            if image.size[0] > 1024 or image.size[1] > 1024:
-                image.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+            if image.size[0] > VISION_MAX_DIMENSION or image.size[1] > VISION_MAX_DIMENSION:
+                image.thumbnail((VISION_MAX_DIMENSION, VISION_MAX_DIMENSION), Image.Resampling.LANCZOS)
             
             buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
-            optimized_data = buffer.getvalue()
-            optimized_b64 = base64.b64encode(optimized_data).decode('utf-8')
+            image.save(buffer, format='JPEG', quality=80, optimize=False)
+            return base64.b64encode(buffer.getvalue()).decode('utf-8')
         except Exception as e:
             # If optimization fails, use original
-            optimized_b64 = base64_image
-        
-        # Call Vision API
+            return base64_image
+    
+    def annotate_images(self, base64_images: List[str]) -> List[dict]:
+        """Run TEXT_DETECTION on a batch of images in a single Vision API call"""
         url = f"https://vision.googleapis.com/v1/images:annotate?key={GOOGLE_VISION_API_KEY}"
         
         payload = {
             "requests": [
                 {
-                    "image": {"content": optimized_b64},
+                    "image": {"content": base64_image},
                     "features": [{"type": "TEXT_DETECTION", "maxResults": 1}]
                 }
+                for base64_image in base64_images
             ]
         }
         
-        response = requests.post(url, json=payload, timeout=30)
+        # The body is dominated by the base64 images, which orjson serializes straight to bytes
+        response = self.session.post(
+            url,
+            data=orjson.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+            timeout=VISION_TIMEOUT
+        )
         response.raise_for_status()
         
-        data = response.json()
+        data = orjson.loads(response.content)
         responses = data.get('responses', [])
         
-        if not responses:
+        if len(responses) != len(base64_images):
             raise Exception("No response from Vision API")
         
-        first_response = responses[0]
+        return responses
+    
+    def identify_piece_simple(self, extracted_text: str) -> PieceIdentification:
+        """UPDATED METHOD - More permissive, encourages educated guesses, but errors if composer is Unknown"""
+        # Same sheet, same OCR text (modulo case/whitespace) -> reuse the earlier identification
+        normalized_text = WHITESPACE_RE.sub(' ', extracted_text.lower()).strip()
+        text_hash = hashlib.blake2b(normalized_text.encode('utf-8'), digest_size=16).hexdigest()
+        cache_key = f"identify:{PROMPT_VERSION}:{text_hash}"
+        cached_identification = self.get_cached(cache_key)
+        if cached_identification is not None:
+            print("♻️ Using cached piece identification")
+            return PieceIdentification(**cached_identification)
         
-        if 'error' in first_response:
-            raise Exception(f"Vision API error: {first_response['error']}")
+        identification_data = self.request_identification(extracted_text, IDENTIFY_MODEL)
         
-        text_annotations = first_response.get('textAnnotations', [])
-        if not text_annotations:
-            raise Exception("No text found in image")
+        # The small model is fast but weaker on hard inputs - retry those with the larger model
+        composer = identification_data.get('composer', '').strip().lower()
+        if identification_data.get('confidence', '').lower() == 'low' or composer in ['unknown', '']:
+            print(f"🔁 Low-confidence identification, retrying with {IDENTIFY_FALLBACK_MODEL}...")
+            identification_data = self.request_identification(extracted_text, IDENTIFY_FALLBACK_MODEL)
         
-        return text_annotations[0].get('description', '')
+        # Check if composer is Unknown and error if so
+        if identification_data.get('composer', '').strip().lower() in ['unknown', '']:
+            raise ValueError("Please show clearer composer")
+        
+        piece_id = PieceIdentification(**identification_data)
+        
+        # A low-confidence answer is retried on the next scan instead of being reused
+        if piece_id.confidence.lower() != 'low':
+            self.cache.set(cache_key, asdict(piece_id), expire=IDENTIFY_CACHE_TTL_SECONDS)
+        return piece_id
     
-    def identify_piece_simple(self, extracted_text: str) -> PieceIdentification:
-        """UPDATED METHOD - More permissive, encourages educated guesses, but errors if composer is Unknown"""
+    def request_identification(self, extracted_text: str, model: str) -> dict:
+        """Ask Groq to identify the piece and return the parsed JSON object"""
         url = "https://api.groq.com/openai/v1/chat/completions"
         
-        prompt = f"""Analyze this sheet music text to identify the essential information. Even if unclear, make educated guesses based on what you can see:
-
-EXTRACTED TEXT:
-{extracted_text}
-
-I need you to identify:
-1. **Title** - The name of the piece (be precise, include subtitles if present)
-2. **Composer** - The composer's name (last name only is perfectly fine)
-3. **Scene/Movement** - Any specific movement, scene, act, or section (if present)
-
-IMPORTANT RULES:
-- **Make educated guesses even if text is unclear or ambiguous**
-- **You MUST be able to identify a composer - if you truly cannot, return "Unknown" and explain why**
-- **Only set confidence to "low" if the text makes absolutely no musical sense or appears to be completely unrelated to sheet music**
-- Even partial information is valuable - if you can identify either a title OR composer (even with uncertainty), proceed with medium confidence
-- Composer last names are totally acceptable (e.g., "Messager", "Brahms", "Mozart")
-- Many pieces don't have scene/movement information - this is completely normal
-- If you see musical terms, instrument names, or anything that suggests this is sheet music, try to extract whatever title/composer info you can find
-- Don't include generic terms like "for orchestra" or instrument names in the title unless they're clearly part of the actual piece title
-
-CONFIDENCE LEVELS:
-- **HIGH**: Clear title and composer, may or may not have scene/movement
-- **MEDIUM**: Can identify at least a title OR composer with reasonable confidence, even if some ambiguity exists
-- **LOW**: Only use this if the text appears to be completely unrelated to music (e.g., random text, technical manuals, etc.) or makes absolutely no sense
-
-Examples of what should get MEDIUM or HIGH confidence (not LOW):
-- "Solo de concours", Composer: "Messager" → HIGH
-- Partial text showing "...Brahms...Intermezzo..." → MEDIUM (make educated guess about title)
-- "Concerto in D" with no clear composer but musical context → set composer to "Unknown" and explain
-- Text mentioning "Mozart" and some piece fragments → MEDIUM (make best guess at title)
-- "Étude" with partial composer name visible → MEDIUM (extract what you can)
-
-Examples that should get LOW confidence:
-- Random computer code or technical documentation
-- Grocery lists or completely non-musical text
-- Text that makes absolutely no sense in any context
-
-STRATEGY: Be optimistic and make reasonable guesses. Musicians often work with incomplete or unclear sheet music, so help them by extracting whatever useful information you can find, even if imperfect.
-
-Return your response in this JSON format:
-{{
-    "title": "exact piece title or best guess based on available text",
-    "composer": "composer name (last name is fine) or 'Unknown' if truly cannot identify",
-    "scene_movement": "specific scene/movement if clearly visible, empty string if not",
-    "confidence": "high/medium/low",
-    "reasoning": "brief explanation of what you found and why you chose this confidence level"
-}}"""
+        prompt = IDENTIFY_PROMPT_PREFIX + extracted_text
 
         payload = {
-            "model": "llama-3.3-70b-versatile",
+            "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": 300,
-            "temperature": 0.1
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"}
         }
         
         headers = {
@@ -315,51 +607,31 @@ Return your response in this JSON format:
             'Content-Type': 'application/json'
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = self.session.post(url, headers=headers, data=orjson.dumps(payload), timeout=GROQ_TIMEOUT)
         response.raise_for_status()
         
-        data = response.json()
+        data = orjson.loads(response.content)
         content = data['choices'][0]['message']['content']
         
-        # Extract JSON from response
-        json_str = self.extract_json_from_content(content)
-        identification_data = json.loads(json_str)
-        
-        # Check if composer is Unknown and error if so
-        if identification_data.get('composer', '').strip().lower() in ['unknown', '']:
-            raise ValueError("Please show clearer composer")
-        
-        return PieceIdentification(**identification_data)
+        # JSON mode guarantees a bare JSON object; fall back to extraction for models without it
+        try:
+            return orjson.loads(content)
+        except ValueError:
+            return orjson.loads(self.extract_json_from_content(content))
         
     def extract_json_from_content(self, content: str) -> str:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
-        content = content.strip()
-        
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1]
-        
+        """Fallback for replies without JSON mode that wrap the object in prose or code fences"""
+        # Code fences never contain braces, so the outermost braces bound the object without stripping them
         start = content.find('{')
-        if start == -1:
-            raise Exception("No JSON object found")
-        
-        brace_count = 0
-        end = start
+        end = content.rfind('}')
         
-        for i, char in enumerate(content[start:]):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    end = start + i + 1
-                    break
+        if start == -1 or end <= start:
+            raise Exception("No JSON object found")
         
-        return content[start:end]
+        return content[start:end + 1]
     
     def create_simple_search_terms(self, piece_id: PieceIdentification, instrument: str) -> List[Tuple[str, str]]:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
+        """Build search strategies in priority order (most specific first)"""
         search_terms = []
         
         # Basic search: "title composer instrument"
@@ -378,6 +650,9 @@ Return your response in this JSON format:
         if piece_id.scene_movement:
             ensemble_scene_search = f"{piece_id.title} {piece_id.composer} {piece_id.scene_movement}"
             search_terms.append((ensemble_scene_search, "ensemble_scene"))
+            
+            # The scene-specific search is the most precise one, so it runs first
+            search_terms[0], search_terms[1] = search_terms[1], search_terms[0]
         
         print(f"📋 Created {len(search_terms)} search strategies:")
         for i, (term, strategy) in enumerate(search_terms, 1):
@@ -385,45 +660,97 @@ Return your response in this JSON format:
         
         return search_terms
     
-    def search_youtube_simple(self, search_terms: List[Tuple[str, str]]) -> List[VideoResult]:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
-        all_videos = {}
+    def search_youtube_simple(self, search_terms: List[Tuple[str, str]], piece_id: PieceIdentification) -> Tuple[List[VideoResult], bool]:
+        """Run the top search strategy, add the rest concurrently only if needed, then fetch details in one batch.
+        
+        Returns the videos and whether every strategy that ran succeeded.
+        """
+        if not search_terms:
+            return [], True
+        
+        # The highest-priority strategy usually finds enough videos on its own
+        strategy_results = self.run_search_strategies(search_terms[:1])
+        strategies_run = 1
+        remaining_terms = search_terms[1:]
+        first_strategy = search_terms[0][1]
+        first_results = strategy_results.get(first_strategy, {})
+        
+        if len(first_results) >= EARLY_EXIT_MIN_VIDEOS and self.count_snippet_matches(first_results, piece_id) >= EARLY_EXIT_MIN_MATCHES:
+            if remaining_terms:
+                skipped = ", ".join(strategy for _, strategy in remaining_terms)
+                print(f"  ⏭️ Strategy '{first_strategy}' found enough matching videos, skipping: {skipped}")
+        elif remaining_terms:
+            strategy_results.update(self.run_search_strategies(remaining_terms))
+            strategies_run += len(remaining_terms)
+        
+        # run_search_strategies leaves failed strategies out of its results
+        search_complete = len(strategy_results) == strategies_run
         
-        for term, strategy in search_terms:
+        # Merge in strategy priority order so duplicates keep the earliest strategy
+        strategy_map = {}
+        for _, strategy in search_terms:
+            for video_id in strategy_results.get(strategy, {}):
+                if video_id not in strategy_map:
+                    strategy_map[video_id] = strategy
+        
+        print(f"📺 Total unique videos found: {len(strategy_map)}")
+        if not strategy_map:
+            return [], search_complete
+        
+        video_ids = list(strategy_map)[:YOUTUBE_MAX_IDS_PER_REQUEST]
+        return self.get_video_details(video_ids, strategy_map), search_complete
+    
+    def count_snippet_matches(self, snippet_titles: Dict[str, str], piece_id: PieceIdentification) -> int:
+        """Count search results whose snippet title matches both the piece title and composer"""
+        titles = list(snippet_titles.values())
+        title_scores = self.fuzzy_score_column(piece_id.title, titles, fuzz.token_set_ratio)
+        composer_scores = self.fuzzy_score_column(piece_id.composer, titles, fuzz.token_set_ratio)
+        return int(np.count_nonzero((title_scores >= EARLY_EXIT_MATCH_SCORE) & (composer_scores >= EARLY_EXIT_MATCH_SCORE)))
+    
+    def run_search_strategies(self, search_terms: List[Tuple[str, str]]) -> Dict[str, Dict[str, str]]:
+        """Run search strategies concurrently and return the videos ({video_id: snippet title}) found per strategy"""
+        strategy_results = {}
+        
+        # Searches are I/O-bound, so run every strategy at once
+        futures = {
+            self.executor.submit(self.search_youtube_ids, term, strategy): strategy
+            for term, strategy in search_terms
+        }
+        for future in as_completed(futures):
+            strategy = futures[future]
             try:
-                videos = self.search_youtube_single(term, strategy)
-                for video in videos:
-                    if video.video_id not in all_videos:
-                        all_videos[video.video_id] = video
-                
-                print(f"  Strategy '{strategy}': {len(videos)} videos")
-                
+                strategy_results[strategy] = future.result()
+                print(f"  Strategy '{strategy}': {len(strategy_results[strategy])} videos")
             except Exception as e:
                 print(f"  Strategy '{strategy}': Failed - {e}")
         
-        print(f"📺 Total unique videos found: {len(all_videos)}")
-        return list(all_videos.values())
+        return strategy_results
     
     def get_next_youtube_api_key(self) -> Optional[str]:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
+        """Round-robin through the YouTube API keys; safe to call from several threads"""
         if not YOUTUBE_API_KEYS:
             return None
         
-        key = YOUTUBE_API_KEYS[self.current_youtube_key_index]
-        self.current_youtube_key_index = (self.current_youtube_key_index + 1) % len(YOUTUBE_API_KEYS)
-        return key
+        with self.youtube_key_lock:
+            return next(self.youtube_key_cycle)
     
     def validate_video_id(self, video_id: str) -> bool:
         """EXACT SAME METHOD AS STANDALONE VERSION"""
         if not video_id or len(video_id) != 11:
             return False
-        # YouTube video IDs are 11 characters long and contain letters, numbers, hyphens, and underscores
-        return re.match(r'^[A-Za-z0-9_-]{11}$', video_id) is not None
+        return VIDEO_ID_RE.match(video_id) is not None
     
-    def search_youtube_single(self, query: str, strategy: str) -> List[VideoResult]:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
+    def search_youtube_ids(self, query: str, strategy: str) -> Dict[str, str]:
+        """Search YouTube and return the valid video IDs with their snippet titles for a single strategy"""
         search_url = "https://www.googleapis.com/youtube/v3/search"
         
+        # search.list is the expensive quota call, so identical queries reuse earlier results
+        cache_key = f"yt:snippets:{query}"
+        cached_videos = self.get_cached(cache_key)
+        if cached_videos is not None:
+            print(f"    ♻️ Using cached search results for: {query}")
+            return dict(cached_videos)
+        
         for attempt in range(len(YOUTUBE_API_KEYS)):
             api_key = self.get_next_youtube_api_key()
             if not api_key:
@@ -439,27 +766,26 @@ Return your response in this JSON format:
             }
             
             try:
-                response = requests.get(search_url, params=params, timeout=30)
+                response = self.session.get(search_url, params=params, timeout=YOUTUBE_TIMEOUT)
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     items = data.get('items', [])
                     
-                    # Validate video IDs before processing
-                    valid_video_ids = []
+                    # Validate video IDs before processing; search snippets return HTML-escaped titles
+                    valid_videos = {}
                     for item in items:
                         if 'id' in item and 'videoId' in item['id']:
                             video_id = item['id']['videoId']
                             if self.validate_video_id(video_id):
-                                valid_video_ids.append(video_id)
+                                valid_videos[video_id] = html.unescape(item.get('snippet', {}).get('title', ''))
                             else:
                                 print(f"    ⚠️ Invalid video ID format: {video_id}")
                     
-                    if valid_video_ids:
-                        return self.get_video_details(valid_video_ids, strategy, api_key)
-                    else:
+                    if not valid_videos:
                         print(f"    ⚠️ No valid video IDs found for query: {query}")
-                        return []
+                    self.cache.set(cache_key, valid_videos, expire=YOUTUBE_CACHE_TTL_SECONDS)
+                    return valid_videos
                 
                 elif response.status_code in [403, 429]:
                     print(f"    YouTube API key issue (status {response.status_code}), trying next key...")
@@ -474,59 +800,72 @@ Return your response in this JSON format:
                     raise Exception(f"All YouTube API keys failed: {str(e)}")
                 continue
         
-        return []
+        # Every key was rejected - surface it so the strategy counts as failed rather than empty
+        raise Exception("All YouTube API keys failed")
     
-    def get_video_details(self, video_ids: List[str], strategy: str, api_key: str) -> List[VideoResult]:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
+    def get_video_details(self, video_ids: List[str], strategy_map: Dict[str, str]) -> List[VideoResult]:
+        """Fetch details for all video IDs, tagging each with the strategy that found it"""
         details_url = "https://www.googleapis.com/youtube/v3/videos"
         
-        # Process video IDs in smaller batches to avoid 400 errors
-        batch_size = 5
+        # videos.list accepts up to 50 IDs; invalid IDs are already filtered by validate_video_id
+        batch_size = YOUTUBE_MAX_IDS_PER_REQUEST
         all_videos = []
         
         for i in range(0, len(video_ids), batch_size):
             batch_ids = video_ids[i:i + batch_size]
             
-            params = {
-                "part": "contentDetails,snippet,statistics",
-                "id": ",".join(batch_ids),
-                "key": api_key
-            }
-            
-            try:
-                print(f"    📡 Fetching details for {len(batch_ids)} videos...")
-                response = requests.get(details_url, params=params, timeout=30)
+            # Same key rotation as search_youtube_ids - a quota-exhausted key moves on to the next one
+            for attempt in range(len(YOUTUBE_API_KEYS)):
+                api_key = self.get_next_youtube_api_key()
+                if not api_key:
+                    raise Exception("No YouTube API keys available")
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    items = data.get('items', [])
+                params = {
+                    "part": "contentDetails,snippet,statistics",
+                    "id": ",".join(batch_ids),
+                    "key": api_key
+                }
+                
+                try:
+                    print(f"    📡 Fetching details for {len(batch_ids)} videos...")
+                    response = self.session.get(details_url, params=params, timeout=YOUTUBE_TIMEOUT)
                     
-                    for item in items:
-                        try:
-                            video = self.parse_video_item(item, strategy)
-                            if video:
-                                all_videos.append(video)
-                        except Exception as e:
-                            print(f"    ⚠️ Error parsing video item: {e}")
-                            continue
-                            
-                elif response.status_code == 400:
-                    print(f"    ⚠️ Bad request for batch {i//batch_size + 1}, trying individual requests...")
-                    # Try each video ID individually
-                    for video_id in batch_ids:
-                        try:
-                            individual_videos = self.get_single_video_details(video_id, strategy, api_key)
-                            all_videos.extend(individual_videos)
-                        except Exception as e:
-                            print(f"    ⚠️ Failed to get details for video {video_id}: {e}")
-                            continue
-                else:
-                    print(f"    ⚠️ Video details API returned status {response.status_code}")
-                    continue
+                    if response.status_code == 200:
+                        data = orjson.loads(response.content)
+                        items = data.get('items', [])
+                        
+                        for item in items:
+                            try:
+                                video = self.parse_video_item(item, strategy_map.get(item.get('id'), ""))
+                                if video:
+                                    all_videos.append(video)
+                            except Exception as e:
+                                print(f"    ⚠️ Error parsing video item: {e}")
+                                continue
+                        break
                     
-            except requests.exceptions.RequestException as e:
-                print(f"    ⚠️ Request error getting video details: {e}")
-                continue
+                    elif response.status_code == 400:
+                        print(f"    ⚠️ Bad request for batch {i//batch_size + 1}, trying individual requests...")
+                        # Try each video ID individually
+                        for video_id in batch_ids:
+                            try:
+                                individual_videos = self.get_single_video_details(video_id, strategy_map[video_id], api_key)
+                                all_videos.extend(individual_videos)
+                            except Exception as e:
+                                print(f"    ⚠️ Failed to get details for video {video_id}: {e}")
+                                continue
+                        break
+                    
+                    elif response.status_code in [403, 429]:
+                        print(f"    YouTube API key issue (status {response.status_code}), trying next key...")
+                        continue
+                    else:
+                        print(f"    ⚠️ Video details API returned status {response.status_code}")
+                        break
+                
+                except requests.exceptions.RequestException as e:
+                    print(f"    ⚠️ Request error getting video details: {e}")
+                    break
         
         return all_videos
     
@@ -541,10 +880,10 @@ Return your response in this JSON format:
         }
         
         try:
-            response = requests.get(details_url, params=params, timeout=15)
+            response = self.session.get(details_url, params=params, timeout=YOUTUBE_TIMEOUT)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 items = data.get('items', [])
                 
                 if items:
@@ -604,11 +943,11 @@ Return your response in this JSON format:
     
     def parse_youtube_duration(self, duration_iso: str) -> int:
         """EXACT SAME METHOD AS STANDALONE VERSION"""
-        try:
-            duration = isodate.parse_duration(duration_iso)
-            return int(duration.total_seconds())
-        except Exception:
+        match = YOUTUBE_DURATION_RE.fullmatch(duration_iso or '')
+        if not match:
             return 0
+        days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+        return days * 86400 + hours * 3600 + minutes * 60 + seconds
     
     def format_duration(self, seconds: int) -> str:
         """EXACT SAME METHOD AS STANDALONE VERSION"""
@@ -622,138 +961,61 @@ Return your response in this JSON format:
         else:
             return f"{minutes}:{remaining_seconds:02d}"
     
+    def score_duration(self, duration_seconds: int) -> float:
+        """Score how plausible a video duration is for a complete performance of one piece/movement"""
+        if duration_seconds <= 0:
+            return 5.0  # Unknown duration (e.g. live streams)
+        if duration_seconds < 90:
+            return 3.0  # Clearly an excerpt
+        if duration_seconds < 120:
+            return 4.0  # Likely an excerpt or practice clip
+        if duration_seconds < 180:
+            return 7.0  # Short but possibly a complete short piece
+        if duration_seconds <= 15 * 60:
+            return 10.0  # Typical complete solo piece, movement or opera scene
+        if duration_seconds <= 20 * 60:
+            return 8.0  # Typical complete orchestral movement
+        if duration_seconds <= 45 * 60:
+            return 6.0  # Long work or several movements
+        return 3.0  # Likely a full concert with multiple pieces
+    
+    def fuzzy_score_column(self, query: str, choices: List[str], scorer) -> np.ndarray:
+        """Score one query against every choice on a 0-10 scale, rounded to one decimal"""
+        scores = process.cdist([query], choices, scorer=scorer, processor=utils.default_process, dtype=np.float64)[0]
+        return np.round(scores / 10.0, 1)
+    
     def rank_by_accuracy(self, videos: List[VideoResult], piece_id: PieceIdentification, instrument: str) -> List[VideoResult]:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
+        """Score videos locally with fuzzy string matching and sort by accuracy"""
         if not videos:
             return []
         
         try:
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            
-            # Prepare video data for scoring
-            videos_data = []
-            for video in videos:
-                videos_data.append({
-                    "id": video.video_id,
-                    "title": video.title,
-                    "channel": video.channel,
-                    "views": video.views,
-                    "duration": video.duration,
-                    "search_strategy": video.search_strategy
-                })
-            
-            prompt = f"""Score these YouTube videos for accuracy in matching this musical piece:
-
-TARGET PIECE:
-- Title: "{piece_id.title}"
-- Composer: "{piece_id.composer}"
-- Scene/Movement: "{piece_id.scene_movement or 'N/A'}"
-- Target Instrument: "{instrument}"
-
-VIDEOS TO SCORE:
-{json.dumps(videos_data, indent=2)}
-
-For each video, provide scores (0-10 scale):
-
-1. **title_match_score**: How well does the video title match "{piece_id.title}"?
-   - 10: Exact match
-   - 8-9: Very close match with minor variations
-   - 6-7: Recognizable match but with differences
-   - 4-5: Partial match
-   - 0-3: Poor or no match
-
-2. **composer_match_score**: How well does the video mention "{piece_id.composer}"?
-   - 10: Exact composer name match
-   - 8-9: Very close (e.g., "Tchaikovsky" vs "P.I. Tchaikovsky")
-   - 6-7: Recognizable but abbreviated
-   - 4-5: Partial mention
-   - 0-3: Wrong or missing composer
-
-3. **scene_match_score**: {"If scene/movement is: " + piece_id.scene_movement if piece_id.scene_movement else "Since no specific scene/movement was identified"}
-   {"- 10: Exact scene/movement match" if piece_id.scene_movement else "- 5: Default score (no scene to match)"}
-   {"- 8-9: Very close scene match" if piece_id.scene_movement else ""}
-   {"- 6-7: Related scene/movement" if piece_id.scene_movement else ""}
-   {"- 4-5: Different scene from same work" if piece_id.scene_movement else ""}
-   {"- 0-3: Wrong or unrelated" if piece_id.scene_movement else ""}
-
-4. **duration_match_score**: How appropriate is the video duration for this piece?
-   Consider these factors:
-   - Is this likely a complete performance or just an excerpt?
-   - Does the duration make sense for the identified piece/movement?
-   - Very short videos (< 2 minutes) are likely excerpts or practice sessions
-   - Very long videos (> 45 minutes) might be full concerts with multiple pieces
-   - For solo pieces: 3-15 minutes often indicates complete movements
-   - For orchestral movements: 5-20 minutes often indicates complete movements
-   - For opera scenes: 3-12 minutes often indicates complete scenes
-   
-   Scoring:
-   - 10: Perfect duration for a complete performance of this piece/movement
-   - 8-9: Good duration, likely complete or nearly complete
-   - 6-7: Reasonable duration but might be abbreviated
-   - 4-5: Duration suggests partial performance or excerpt
-   - 0-3: Duration clearly wrong (too short/long for this piece)
-
-5. **overall_accuracy_score**: Weighted average
-   - title_match_score * 0.35
-   - composer_match_score * 0.35  
-   - scene_match_score * 0.15
-   - duration_match_score * 0.15
-
-CRITICAL REQUIREMENTS:
-- Videos with WRONG piece titles should get title_match_score ≤ 3
-- Videos with WRONG composers should get composer_match_score ≤ 3
-- Videos that are clearly excerpts (< 90 seconds) should get duration_match_score ≤ 4
-- Only give high scores (8+) to videos that are clearly the correct piece with appropriate duration
-
-Return ONLY a JSON array with this format:
-[
-  {{
-    "video_id": "id1",
-    "title_match_score": 8.5,
-    "composer_match_score": 9.0,
-    "scene_match_score": 7.0,
-    "duration_match_score": 8.0,
-    "overall_accuracy_score": 8.1
-  }},
-  ...
-]"""
-            
-            payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1000,
-                "temperature": 0.1
-            }
-            
-            headers = {
-                'Authorization': f'Bearer {GROQ_API_KEY}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
+            # Score whole columns at once - rapidfuzz compares one query against every video in C
+            titles = [video.title for video in videos]
+            title_and_channels = [f"{video.title} {video.channel}" for video in videos]
             
-            data = response.json()
-            content = data['choices'][0]['message']['content']
-            
-            # Extract JSON array from response
-            scores_data = json.loads(self.extract_json_array_from_content(content))
+            # One row per video: title, composer, scene, duration
+            scores = np.empty((len(videos), 4))
+            scores[:, 0] = self.fuzzy_score_column(piece_id.title, titles, fuzz.token_set_ratio)
+            scores[:, 1] = self.fuzzy_score_column(piece_id.composer, title_and_channels, fuzz.token_set_ratio)
+            if piece_id.scene_movement:
+                scores[:, 2] = self.fuzzy_score_column(piece_id.scene_movement, titles, fuzz.partial_ratio)
+            else:
+                scores[:, 2] = 5.0  # Default score (no scene to match)
+            scores[:, 3] = [self.score_duration(video.duration_seconds) for video in videos]
             
-            # Apply scores to videos
-            video_dict = {video.video_id: video for video in videos}
+            overall_scores = np.round(scores @ ACCURACY_WEIGHTS, 1)
             
-            for score_item in scores_data:
-                video_id = score_item['video_id']
-                if video_id in video_dict:
-                    video = video_dict[video_id]
-                    video.title_match_score = score_item['title_match_score']
-                    video.composer_match_score = score_item['composer_match_score']
-                    video.scene_match_score = score_item['scene_match_score']
-                    video.duration_match_score = score_item['duration_match_score']
-                    video.overall_accuracy_score = score_item['overall_accuracy_score']
+            for video, (title, composer, scene, duration), overall in zip(videos, scores.tolist(), overall_scores.tolist()):
+                video.title_match_score = title
+                video.composer_match_score = composer
+                video.scene_match_score = scene
+                video.duration_match_score = duration
+                video.overall_accuracy_score = overall
             
-            # Sort by overall accuracy score (prioritizing scene matches)
-            ranked_videos = sorted(videos, key=lambda x: (x.overall_accuracy_score, x.scene_match_score), reverse=True)
+            # Sort by overall accuracy score (prioritizing scene matches) - lexsort's last key is the primary one
+            ranked_order = np.lexsort((-scores[:, 2], -overall_scores))
+            ranked_videos = [videos[i] for i in ranked_order]
             
             print(f"🎯 Ranked {len(ranked_videos)} videos by accuracy")
             print("🏆 Top 3 most accurate matches:")
@@ -768,44 +1030,53 @@ Return ONLY a JSON array with this format:
             print(f"⚠️ Accuracy ranking failed: {e}, using fallback")
             # Fallback: simple ranking by views
             return sorted(videos, key=lambda x: x.views, reverse=True)
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for faster request parsing and jsonify"""
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode('utf-8')
     
-    def extract_json_array_from_content(self, content: str) -> str:
-        """EXACT SAME METHOD AS STANDALONE VERSION"""
-        content = content.strip()
-        
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1]
-        
-        start = content.find('[')
-        end = content.rfind(']')
-        
-        if start != -1 and end != -1 and end > start:
-            return content[start:end + 1]
-        
-        raise Exception("No JSON array found in content")
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # orjson already produces bytes, so skip the str round trip dumps() would add
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
 
 # Flask App Setup
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
+# Compress the test page and /scan JSON - Brotli when the client supports it, gzip otherwise
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 512
+Compress(app)
+
 # Initialize scanner with EXACT SAME LOGIC
 scanner = AccurateMusicScannerAPI()
 
+# /instruments never changes at runtime, so its body is serialized once at import
+INSTRUMENTS_RESPONSE = orjson.dumps({
+    "supported_instruments": SUPPORTED_INSTRUMENTS,
+    "default": "clarinet",
+    "total_count": len(SUPPORTED_INSTRUMENTS)
+})
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "Music Scanner API with EXACT Standalone Logic"})
+    return jsonify({
+        "status": "healthy",
+        "service": "Music Scanner API with EXACT Standalone Logic",
+        "cache": scanner.get_cache_stats()
+    })
 
 @app.route('/instruments', methods=['GET'])
 def get_supported_instruments():
     """Get list of supported instruments"""
-    return jsonify({
-        "supported_instruments": SUPPORTED_INSTRUMENTS,
-        "default": "clarinet",
-        "total_count": len(SUPPORTED_INSTRUMENTS)
-    })
+    return app.response_class(INSTRUMENTS_RESPONSE, mimetype='application/json')
 
 @app.route('/scan', methods=['POST'])
 def scan_music():
@@ -828,27 +1099,44 @@ def scan_music():
         if not target_instrument:
             return jsonify({
                 "error": "Instrument parameter is required",
-                "supported_instruments": SUPPORTED_INSTRUMENTS[:10],
+                "supported_instruments": SUPPORTED_INSTRUMENTS_PREVIEW,
                 "example": "clarinet"
             }), 400
         
-        # Validate image data format
-        try:
-            base64.b64decode(image_data_b64)
-        except Exception:
+        # Reject instruments that alias, whole-word and fuzzy matching cannot resolve, before any OCR, LLM or YouTube work
+        validated_instrument = scanner.validate_instrument(target_instrument)
+        if validated_instrument not in SUPPORTED_INSTRUMENTS_SET:
+            return jsonify({
+                "error": f"Unsupported instrument: {target_instrument}",
+                "supported_instruments": SUPPORTED_INSTRUMENTS_PREVIEW,
+                "example": "clarinet"
+            }), 400
+        
+        # Validate image data format - charset and padded length are enough here, the image is decoded once during OCR
+        if not isinstance(image_data_b64, str) or len(image_data_b64) % 4 or not BASE64_RE.fullmatch(image_data_b64):
             return jsonify({"error": "Invalid base64 image data"}), 400
         
         print(f"🎵 Processing scan request for instrument: {target_instrument}")
         
+        # Identical image + instrument -> return the earlier result without OCR, LLM or YouTube calls
+        image_hash = hashlib.blake2b(image_data_b64.encode('ascii'), digest_size=16).hexdigest()
+        cache_key = f"scan:{PROMPT_VERSION}:{image_hash}:{validated_instrument}"
+        cached_result = scanner.get_cached(cache_key)
+        if cached_result is not None:
+            print("♻️ Returning cached scan result")
+            return jsonify(cached_result)
+        
         # Use EXACT SAME LOGIC as standalone version
-        result = scanner.scan_music_from_base64(image_data_b64, target_instrument)
+        result, cacheable = scanner.scan_music_from_base64(image_data_b64, validated_instrument)
         
         # Check if we got a valid result or an error
         if result["piece_identification"]["confidence"] == "low":
             # This is an error response
             return jsonify(result), 422  # Unprocessable Entity
         
-        # Return successful analysis and video data
+        # Return successful analysis and video data - partial results (a search strategy failed) are not cached
+        if cacheable:
+            scanner.cache.set(cache_key, result, expire=SCAN_CACHE_TTL_SECONDS)
         return jsonify(result)
     
     except Exception as e:
@@ -856,10 +1144,10 @@ def scan_music():
         error_response = scanner.create_error_response(f"API error: {str(e)}")
         return jsonify(error_response), 500
 
-@app.route('/')
-def home():
-    """Web interface for testing"""
-    html = f"""
+# Test page is fully static, so it is rendered once at import
+INSTRUMENT_OPTIONS_HTML = ''.join(f'<option value="{inst}">{inst.title()}</option>' for inst in SUPPORTED_INSTRUMENTS)
+
+HOME_HTML = f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -899,7 +1187,7 @@ def home():
             
             <label for="instrument">Choose Instrument:</label><br>
             <select id="instrument" style="width: 200px;">
-                {''.join([f'<option value="{inst}">{inst.title()}</option>' for inst in SUPPORTED_INSTRUMENTS])}
+                {INSTRUMENT_OPTIONS_HTML}
             </select><br><br>
             
             <label for="imageFile">Upload Sheet Music Image:</label><br>
@@ -1100,7 +1388,11 @@ def home():
     </body>
     </html>
     """
-    return html
+
+@app.route('/')
+def home():
+    """Web interface for testing"""
+    return HOME_HTML
 
 def main():
     """Main function to run the Flask app with EXACT standalone logic"""
@@ -1113,7 +1405,8 @@ def main():
     print("  POST /scan        - Complete scan with piece identification + video data")
     print(f"  Supported instruments: {len(SUPPORTED_INSTRUMENTS)} total")
     print("✅ EXACT SAME LOGIC as working standalone version!")
-    app.run(debug=True, host='0.0.0.0', port=8000)
+    print("⚠️ Development server - for production run: gunicorn -c gunicorn.conf.py main:app")
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", host='0.0.0.0', port=8000, threaded=True)
 
 if __name__ == '__main__':
     main()